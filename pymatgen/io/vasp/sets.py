@@ -20,16 +20,22 @@ __date__ = "Nov 16, 2011"
 
 import os
 import abc
+import errno
 
 import re
-import traceback
 import shutil
+import copy
+import itertools
+import collections
 from functools import partial
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 
 import six
 import numpy as np
 
 from monty.serialization import loadfn
+from monty.functools import lru_cache
 
 from pymatgen.io.vasp.inputs import Incar, Poscar, Potcar, Kpoints
 from pymatgen.io.vasp.outputs import Vasprun, Outcar
@@ -39,6 +45,51 @@ from pymatgen.symmetry.bandstructure import HighSymmKpath
 
 MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+_WS_RE = re.compile(r"\s+")
+
+
+@lru_cache(None)
+def _parse_config(filename):
+    return loadfn(filename)
+
+
+def _load_config(filename):
+    """
+    Loads the settings in a yaml/json config file. The config files shipped
+    in MODULE_DIR are parsed once and cached, so that creating many input
+    sets does not re-read them. A deep copy is returned since input sets
+    modify their settings in place. Other files, e.g., user configs passed
+    to DictVaspInputSet.from_file, are always read afresh since they may be
+    edited between calls.
+    """
+    filename = os.path.abspath(filename)
+    if os.path.dirname(filename) != MODULE_DIR:
+        return loadfn(filename)
+    return copy.deepcopy(_parse_config(filename))
+
+
+def _makedirs(path):
+    """
+    Creates a directory (and the whole path), if it is not already present.
+    Unlike checking os.path.exists first, this saves a stat call per
+    directory and is not subject to races with other processes.
+    """
+    try:
+        os.makedirs(path)
+    except OSError as ex:
+        if ex.errno != errno.EEXIST or not os.path.isdir(path):
+            raise
+
+
+def _get_site_symbols(structure):
+    """
+    Sequence of symbols of consecutive runs of sites with the same element,
+    i.e., the same as Poscar(structure).site_symbols without creating a
+    Poscar.
+    """
+    return [sym for sym, _ in
+            itertools.groupby(site.specie.symbol for site in structure)]
+
 
 class AbstractVaspInputSet(six.with_metaclass(abc.ABCMeta, PMGSONable)):
     """
@@ -154,8 +205,8 @@ class AbstractVaspInputSet(six.with_metaclass(abc.ABCMeta, PMGSONable)):
             include_cif (bool): Whether to write a CIF file in the output
                 directory for easier opening by VESTA.
         """
-        if make_dir_if_not_present and not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        if make_dir_if_not_present:
+            _makedirs(output_dir)
         for k, v in self.get_all_vasp_input(structure).items():
             v.write_file(os.path.join(output_dir, k))
             if k == "POSCAR" and include_cif:
@@ -225,7 +276,16 @@ class DictVaspInputSet(AbstractVaspInputSet):
         self.name = name
         self.potcar_settings = config_dict["POTCAR"]
         self.kpoints_settings = config_dict['KPOINTS']
-        self.incar_settings = config_dict['INCAR']
+        # The final INCAR settings are built in a single new dict, which also
+        # leaves config_dict untouched.
+        if hubbard_off:
+            incar_settings = {k: v for k, v in config_dict['INCAR'].items()
+                              if not k.startswith("LDAU")}
+        else:
+            incar_settings = dict(config_dict['INCAR'])
+        if user_incar_settings:
+            incar_settings.update(user_incar_settings)
+        self.incar_settings = incar_settings
         self.set_nupdown = constrain_total_magmom
         self.sort_structure = sort_structure
         self.ediff_per_atom = ediff_per_atom
@@ -233,43 +293,72 @@ class DictVaspInputSet(AbstractVaspInputSet):
         self.potcar_functional = potcar_functional
         self.force_gamma = force_gamma
         self.reduce_structure = reduce_structure
-        if hubbard_off:
-            for k in list(self.incar_settings.keys()):
-                if k.startswith("LDAU"):
-                    del self.incar_settings[k]
-        if user_incar_settings:
-            self.incar_settings.update(user_incar_settings)
 
-    def get_incar(self, structure):
-        incar = Incar()
+    def _prepare_structure(self, structure):
+        """
+        Reduces and sorts a structure according to the input set settings.
+        get_all_vasp_input prepares the structure once before handing it to
+        the individual get_* methods, which prepare it again. Since sorted
+        structures are returned as is, that second pass only checks the
+        site order.
+        """
         if self.reduce_structure:
             structure = structure.get_reduced_structure(self.reduce_structure)
         if self.sort_structure:
-            structure = structure.get_sorted_structure()
+            # Structures that are already sorted (e.g., from a previous
+            # step of a workflow) are used as is instead of being rebuilt.
+            sites = structure.sites
+            if any(sites[i + 1] < sites[i] for i in range(len(sites) - 1)):
+                structure = structure.get_sorted_structure()
+        return structure
+
+    def get_all_vasp_input(self, structure, generate_potcar=True):
+        return super(DictVaspInputSet, self).get_all_vasp_input(
+            self._prepare_structure(structure),
+            generate_potcar=generate_potcar)
+
+    def get_incar(self, structure):
+        incar = Incar()
+        structure = self._prepare_structure(structure)
         comp = structure.composition
-        elements = sorted([el for el in comp.elements if comp[el] > 0],
-                          key=lambda e: e.X)
-        most_electroneg = elements[-1].symbol
-        poscar = Poscar(structure)
+        # Composition only holds elements with non-zero amounts. Reversed so
+        # that ties are resolved in favor of the last element, as a sort
+        # would.
+        most_electroneg = max(reversed(comp.elements),
+                              key=lambda e: e.X).symbol
+        site_symbols = _get_site_symbols(structure)
+        # Hubbard U is only used if the most electronegative element has
+        # U values for the elements present, otherwise the LDAU tags are
+        # left out of the incar altogether.
+        u_settings = self.incar_settings.get('LDAUU', {})
+        has_u = most_electroneg in u_settings and \
+            sum(u_settings[most_electroneg].get(sym, 0)
+                for sym in site_symbols) > 0
         for key, setting in self.incar_settings.items():
             if key == "MAGMOM":
-                mag = []
-                for site in structure:
-                    if hasattr(site, 'magmom'):
-                        mag.append(site.magmom)
-                    elif hasattr(site.specie, 'spin'):
-                        mag.append(site.specie.spin)
-                    elif str(site.specie) in setting:
-                        mag.append(setting.get(str(site.specie)))
+                # The fallback magmom only depends on the species, so it is
+                # determined once per species rather than once per site.
+                species = structure.species
+                specie_mag = {}
+                for sp in set(species):
+                    if hasattr(sp, 'spin'):
+                        specie_mag[sp] = sp.spin
+                    elif str(sp) in setting:
+                        specie_mag[sp] = setting.get(str(sp))
                     else:
-                        mag.append(setting.get(site.specie.symbol, 0.6))
-                incar[key] = mag
+                        specie_mag[sp] = setting.get(sp.symbol, 0.6)
+                site_mags = structure.site_properties.get(
+                    'magmom', [None] * len(species))
+                incar[key] = [specie_mag[sp] if m is None else m
+                              for m, sp in zip(site_mags, species)]
+            elif key.startswith('LDAU') and not has_u:
+                continue
             elif key in ('LDAUU', 'LDAUJ', 'LDAUL'):
-                if most_electroneg in setting.keys():
+                if most_electroneg in setting:
                     incar[key] = [setting[most_electroneg].get(sym, 0)
-                                  for sym in poscar.site_symbols]
+                                  for sym in site_symbols]
                 else:
-                    incar[key] = [0] * len(poscar.site_symbols)
+                    incar[key] = [0] * len(site_symbols)
             elif key == "EDIFF":
                 if self.ediff_per_atom:
                     incar[key] = float(setting) * structure.num_sites
@@ -278,42 +367,35 @@ class DictVaspInputSet(AbstractVaspInputSet):
             else:
                 incar[key] = setting
 
-        has_u = ("LDAUU" in incar and sum(incar['LDAUU']) > 0)
         if has_u:
             # modify LMAXMIX if LSDA+U and you have d or f electrons
             # note that if the user explicitly sets LMAXMIX in settings it will
             # override this logic.
-            if 'LMAXMIX' not in self.incar_settings.keys():
+            if 'LMAXMIX' not in self.incar_settings:
+                max_z = max(el.Z for el in comp.elements)
                 # contains f-electrons
-                if any([el.Z > 56 for el in structure.composition]):
+                if max_z > 56:
                     incar['LMAXMIX'] = 6
                 # contains d-electrons
-                elif any([el.Z > 20 for el in structure.composition]):
+                elif max_z > 20:
                     incar['LMAXMIX'] = 4
-        else:
-            for key in list(incar.keys()):
-                if key.startswith('LDAU'):
-                    del incar[key]
 
         if self.set_nupdown:
-            nupdown = sum([mag if abs(mag) > 0.6 else 0
-                           for mag in incar['MAGMOM']])
-            incar['NUPDOWN'] = nupdown
+            incar['NUPDOWN'] = sum(m for m in incar['MAGMOM'] if abs(m) > 0.6)
 
         return incar
 
     def get_poscar(self, structure):
-        if self.reduce_structure:
-            structure = structure.get_reduced_structure(self.reduce_structure)
-        if self.sort_structure:
-            structure = structure.get_sorted_structure()
-        return Poscar(structure)
+        prepared = self._prepare_structure(structure)
+        if prepared is structure and self.sort_structure:
+            # Already sorted structures are not rebuilt by
+            # _prepare_structure, but the Poscar still gets its own copy
+            # rather than sharing the caller's structure.
+            prepared = structure.copy()
+        return Poscar(prepared)
 
     def get_potcar(self, structure, check_hash=False):
-        if self.reduce_structure:
-            structure = structure.get_reduced_structure(self.reduce_structure)
-        if self.sort_structure:
-            structure = structure.get_sorted_structure()
+        structure = self._prepare_structure(structure)
         if self.potcar_functional:
             p = Potcar(self.get_potcar_symbols(structure),
                           functional=self.potcar_functional)
@@ -344,12 +426,10 @@ class DictVaspInputSet(AbstractVaspInputSet):
         return n
 
     def get_potcar_symbols(self, structure):
-        if self.reduce_structure:
-            structure = structure.get_reduced_structure(self.reduce_structure)
-        if self.sort_structure:
-            structure = structure.get_sorted_structure()
-        p = self.get_poscar(structure)
-        elements = p.site_symbols
+        # get_poscar already prepares the structure. It is used rather than
+        # _get_site_symbols since subclasses may override it to change the
+        # structure that is written.
+        elements = self.get_poscar(structure).site_symbols
         potcar_symbols = []
 
         if isinstance(self.potcar_settings[elements[-1]], dict):
@@ -372,10 +452,7 @@ class DictVaspInputSet(AbstractVaspInputSet):
             Uses a simple approach scaling the number of divisions along each
             reciprocal lattice vector proportional to its length.
         """
-        if self.reduce_structure:
-            structure = structure.get_reduced_structure(self.reduce_structure)
-        if self.sort_structure:
-            structure = structure.get_sorted_structure()
+        structure = self._prepare_structure(structure)
 
         # If grid_density is in the kpoints_settings use Kpoints.automatic_density
         if self.kpoints_settings.get('grid_density'):
@@ -449,7 +526,7 @@ class DictVaspInputSet(AbstractVaspInputSet):
         Returns:
             DictVaspInputSet
         """
-        return DictVaspInputSet(name, loadfn(filename), **kwargs)
+        return DictVaspInputSet(name, _load_config(filename), **kwargs)
 
 
 MITVaspInputSet = partial(DictVaspInputSet.from_file, "MIT",
@@ -503,7 +580,7 @@ class MITNEBVaspInputSet(DictVaspInputSet):
 
         super(MITNEBVaspInputSet, self).__init__(
             "MIT NEB",
-            loadfn(os.path.join(MODULE_DIR, "MITVaspInputSet.yaml")),
+            _load_config(os.path.join(MODULE_DIR, "MITVaspInputSet.yaml")),
             user_incar_settings=defaults, ediff_per_atom=False, **kwargs)
         self.nimages = nimages
 
@@ -523,7 +600,7 @@ class MITNEBVaspInputSet(DictVaspInputSet):
         return structures
 
     def write_input(self, structures, output_dir, make_dir_if_not_present=True,
-                    write_cif=False):
+                    write_cif=False, nthreads=None):
         """
         NEB inputs has a special directory structure where inputs are in 00,
         01, 02, ....
@@ -536,26 +613,42 @@ class MITNEBVaspInputSet(DictVaspInputSet):
                 directory (and the whole path) to be created if it is not
                 present.
             write_cif (bool): If true, writes a cif along with each POSCAR.
+            nthreads (int): Number of threads to use for writing the image
+                directories, which helps on slow (e.g., networked) file
+                systems. Default is None, which implies serial.
         """
         if len(structures) != self.incar_settings['IMAGES'] + 2:
             raise ValueError('incorrect number of structures')
 
         structures = self._process_structures(structures)
 
-        if make_dir_if_not_present and not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        if make_dir_if_not_present:
+            _makedirs(output_dir)
         s0 = structures[0]
         self.get_incar(s0).write_file(os.path.join(output_dir, 'INCAR'))
         self.get_kpoints(s0).write_file(os.path.join(output_dir, 'KPOINTS'))
         self.get_potcar(s0).write_file(os.path.join(output_dir, 'POTCAR'))
-        for i, s in enumerate(structures):
+
+        def write_image(i):
+            s = structures[i]
             d = os.path.join(output_dir, str(i).zfill(2))
-            if make_dir_if_not_present and not os.path.exists(d):
-                os.makedirs(d)
+            if make_dir_if_not_present:
+                _makedirs(d)
             self.get_poscar(s).write_file(os.path.join(d, 'POSCAR'))
             if write_cif:
                 s.to(filename=os.path.join(d, '{}.cif'.format(i)))
 
+        if nthreads:
+            pool = ThreadPool(nthreads)
+            try:
+                pool.map(write_image, range(len(structures)))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for i in range(len(structures)):
+                write_image(i)
+
     def as_dict(self):
         d = super(MITNEBVaspInputSet, self).as_dict()
         d["nimages"] = self.nimages
@@ -611,7 +704,7 @@ class MITMDVaspInputSet(DictVaspInputSet):
             defaults.update(user_incar_settings)
         super(MITMDVaspInputSet, self).__init__(
             "MIT MD",
-            loadfn(os.path.join(MODULE_DIR, "MITVaspInputSet.yaml")),
+            _load_config(os.path.join(MODULE_DIR, "MITVaspInputSet.yaml")),
             hubbard_off=hubbard_off, sort_structure=sort_structure,
             user_incar_settings=defaults, **kwargs)
 
@@ -715,7 +808,7 @@ class MPStaticVaspInputSet(DictVaspInputSet):
     def __init__(self, kpoints_density=90, sym_prec=0.1, **kwargs):
         super(MPStaticVaspInputSet, self).__init__(
             "MP Static",
-            loadfn(os.path.join(MODULE_DIR, "MPVaspInputSet.yaml")),
+            _load_config(os.path.join(MODULE_DIR, "MPVaspInputSet.yaml")),
             **kwargs)
         self.incar_settings.update(
             {"IBRION": -1, "ISMEAR": -5, "LAECHG": True, "LCHARG": True,
@@ -723,6 +816,7 @@ class MPStaticVaspInputSet(DictVaspInputSet):
              "ICHARG": 0, "EDIFF": 0.000001, "ALGO": "Normal"})
         self.kpoints_settings.update({"kpoints_density": kpoints_density})
         self.sym_prec = sym_prec
+        self._primitive_cache = collections.OrderedDict()
 
     def get_kpoints(self, structure, primitive_standard=False):
         """
@@ -735,13 +829,33 @@ class MPStaticVaspInputSet(DictVaspInputSet):
             a primitive standardized cell
         """
         if not primitive_standard:
-            structure = self.get_poscar(structure).structure
+            structure = self._get_primitive_structure(structure)
         self.kpoints_settings['grid_density'] = \
             self.kpoints_settings["kpoints_density"] * \
             structure.lattice.reciprocal_lattice.volume * \
             structure.num_sites
         return super(MPStaticVaspInputSet, self).get_kpoints(structure)
 
+    def _get_primitive_structure(self, structure):
+        """
+        Returns the primitive standard structure. get_kpoints, get_poscar
+        and get_potcar all need it for the same structure, so it is cached
+        on the lattice, species and coordinates of the structure. A copy is
+        returned, so that the written inputs do not share a structure.
+        """
+        key = (self.sym_prec, structure.lattice.matrix.tostring(),
+               structure.frac_coords.tostring(),
+               tuple(site.species_string for site in structure))
+        primitive = self._primitive_cache.get(key)
+        if primitive is None:
+            sym_finder = SpacegroupAnalyzer(structure, symprec=self.sym_prec)
+            primitive = sym_finder.get_primitive_standard_structure(False)
+            self._primitive_cache[key] = primitive
+            # Keep only the most recently analyzed structures.
+            if len(self._primitive_cache) > 4:
+                self._primitive_cache.popitem(last=False)
+        return primitive.copy()
+
     def get_poscar(self, structure):
         """
         Get a POSCAR file with a primitive standardized cell of
@@ -750,8 +864,7 @@ class MPStaticVaspInputSet(DictVaspInputSet):
         Args:
             structure (Structure/IStructure): structure to get POSCAR
         """
-        sym_finder = SpacegroupAnalyzer(structure, symprec=self.sym_prec)
-        return Poscar(sym_finder.get_primitive_standard_structure(False))
+        return Poscar(self._get_primitive_structure(structure))
 
     @staticmethod
     def get_structure(vasp_run, outcar=None, initial_structure=False,
@@ -782,26 +895,23 @@ class MPStaticVaspInputSet(DictVaspInputSet):
             if outcar and outcar.magnetization:
                 magmom = {"magmom": [i['tot'] for i in outcar.magnetization]}
             else:
-                magmom = {
-                    "magmom": vasp_run.as_dict()['input']['parameters']
-                    ['MAGMOM']}
+                magmom = {"magmom": vasp_run.parameters['MAGMOM']}
         else:
             magmom = None
         structure = vasp_run.final_structure
         if magmom:
             structure = structure.copy(site_properties=magmom)
-        sym_finder = SpacegroupAnalyzer(structure, symprec=sym_prec)
         if initial_structure:
             return structure
-        elif additional_info:
+        sym_finder = SpacegroupAnalyzer(structure, symprec=sym_prec)
+        primitive = sym_finder.get_primitive_standard_structure(False)
+        if additional_info:
             info = [sym_finder.get_refined_structure(),
                     sym_finder.get_conventional_standard_structure(False),
                     sym_finder.get_symmetry_dataset(),
                     sym_finder.get_symmetry_operations()]
-            return [sym_finder.get_primitive_standard_structure(False),
-                    info]
-        else:
-            return sym_finder.get_primitive_standard_structure(False)
+            return [primitive, info]
+        return primitive
 
     @staticmethod
     def from_previous_vasp_run(previous_vasp_dir, output_dir='.',
@@ -828,20 +938,28 @@ class MPStaticVaspInputSet(DictVaspInputSet):
         # Read input and output from previous run
         try:
             vasp_run = Vasprun(os.path.join(previous_vasp_dir, "vasprun.xml"),
-                               parse_dos=False, parse_eigen=None)
+                               parse_dos=False, parse_eigen=False,
+                               parse_potcar_file=False)
             outcar = Outcar(os.path.join(previous_vasp_dir, "OUTCAR"))
             previous_incar = vasp_run.incar
             previous_kpoints = vasp_run.kpoints
-        except:
-            traceback.print_exc()
-            raise RuntimeError("Can't get valid results from previous run. prev dir: {}".format(previous_vasp_dir))
+        except Exception as ex:
+            raise RuntimeError("Can't get valid results from previous run. "
+                               "prev dir: {}\n{}".format(previous_vasp_dir, ex))
 
         mpsvip = MPStaticVaspInputSet(kpoints_density=kpoints_density,
                                       sym_prec=sym_prec)
         structure = mpsvip.get_structure(vasp_run, outcar)
 
-        mpsvip.write_input(structure, output_dir, make_dir_if_not_present)
-        new_incar = mpsvip.get_incar(structure)
+        # Write the inputs from a single get_all_vasp_input call, so that the
+        # symmetry analysis is done only once. The INCAR and KPOINTS written
+        # here are overwritten further below.
+        if make_dir_if_not_present:
+            _makedirs(output_dir)
+        vasp_input = mpsvip.get_all_vasp_input(structure)
+        for k, v in vasp_input.items():
+            v.write_file(os.path.join(output_dir, k))
+        new_incar = vasp_input["INCAR"]
 
         # Use previous run INCAR and override necessary parameters
         previous_incar.update({"IBRION": -1, "ISMEAR": -5, "LAECHG": True,
@@ -887,7 +1005,7 @@ class MPStaticVaspInputSet(DictVaspInputSet):
             raise ValueError("Incompatible INCAR parameters!")
 
         # Prefer to use k-point scheme from previous run
-        new_kpoints = mpsvip.get_kpoints(structure)
+        new_kpoints = vasp_input["KPOINTS"]
         if previous_kpoints.style[0] != new_kpoints.style[0]:
             if previous_kpoints.style[0] == "M" and \
                     SpacegroupAnalyzer(structure, 0.1).get_lattice_type() != \
@@ -919,7 +1037,7 @@ class MPStaticDielectricDFPTVaspInputSet(DictVaspInputSet):
     def __init__(self, user_incar_settings=None, ionic=True):
         super(MPStaticDielectricDFPTVaspInputSet, self).__init__(
             "Materials Project Static Dielectric DFPT",
-            loadfn(os.path.join(MODULE_DIR, "MPVaspInputSet.yaml")))
+            _load_config(os.path.join(MODULE_DIR, "MPVaspInputSet.yaml")))
         self.user_incar_settings = user_incar_settings if \
             user_incar_settings is not None else {}
         self.incar_settings.update(self.user_incar_settings)
@@ -960,7 +1078,7 @@ class MPBSHSEVaspInputSet(DictVaspInputSet):
                  kpoints_density=None, kpoints_line_density=20):
         super(MPBSHSEVaspInputSet, self).__init__(
             "Materials Project HSE Band Structure",
-            loadfn(os.path.join(MODULE_DIR, "MPHSEVaspInputSet.yaml")))
+            _load_config(os.path.join(MODULE_DIR, "MPHSEVaspInputSet.yaml")))
         self.user_incar_settings = user_incar_settings if \
             user_incar_settings is not None else {}
         self.incar_settings.update(
@@ -981,17 +1099,10 @@ class MPBSHSEVaspInputSet(DictVaspInputSet):
             kpath = HighSymmKpath(structure)
             frac_k_points, labels = kpath.get_kpoints(line_density=self.kpoints_line_density,
                                                       coords_are_cartesian=False)
-            kpts = []
-            weights = []
-            all_labels = []
-            for k in ir_kpts:
-                kpts.append(k[0])
-                weights.append(int(k[1]))
-                all_labels.append(None)
-            for k in range(len(frac_k_points)):
-                kpts.append(frac_k_points[k])
-                weights.append(0.0)
-                all_labels.append(labels[k])
+            kpts = [k[0] for k in ir_kpts] + list(frac_k_points)
+            weights = [int(k[1]) for k in ir_kpts] + \
+                [0.0] * len(frac_k_points)
+            all_labels = [None] * len(ir_kpts) + list(labels)
             return Kpoints(comment="HSE run along symmetry lines",
                            style="Reciprocal", num_kpts=len(kpts),
                            kpts=kpts, kpts_weights=weights, labels=all_labels)
@@ -999,14 +1110,9 @@ class MPBSHSEVaspInputSet(DictVaspInputSet):
         elif self.mode == "Uniform":
             ir_kpts = SpacegroupAnalyzer(structure, symprec=0.1)\
                 .get_ir_reciprocal_mesh(grid[0])
-            kpts = []
-            weights = []
-            for k in ir_kpts:
-                kpts.append(k[0])
-                weights.append(int(k[1]))
-            for k in self.added_kpoints:
-                kpts.append(k)
-                weights.append(0.0)
+            kpts = [k[0] for k in ir_kpts] + list(self.added_kpoints)
+            weights = [int(k[1]) for k in ir_kpts] + \
+                [0.0] * len(self.added_kpoints)
             return Kpoints(comment="HSE run on uniform grid",
                            style="Reciprocal", num_kpts=len(kpts),
                            kpts=kpts, kpts_weights=weights)
@@ -1068,7 +1174,7 @@ class MPNonSCFVaspInputSet(MPStaticVaspInputSet):
                              "'Uniform'!")
         DictVaspInputSet.__init__(self,
             "Materials Project Static",
-            loadfn(os.path.join(MODULE_DIR, "MPVaspInputSet.yaml")),
+            _load_config(os.path.join(MODULE_DIR, "MPVaspInputSet.yaml")),
             constrain_total_magmom=constrain_total_magmom,
             sort_structure=sort_structure)
         self.user_incar_settings = user_incar_settings
@@ -1084,6 +1190,7 @@ class MPNonSCFVaspInputSet(MPStaticVaspInputSet):
                            "required!")
         else:
             self.incar_settings.update(user_incar_settings)
+        self._kpoints_cache = collections.OrderedDict()
 
     def get_kpoints(self, structure):
         """
@@ -1091,9 +1198,28 @@ class MPNonSCFVaspInputSet(MPStaticVaspInputSet):
         generated along high symmetry lines. In "Uniform" mode, kpoints are
         Gamma-centered mesh grid. Kpoints are written explicitly in both cases.
 
+        The symmetry analysis is cached on the lattice, species and
+        coordinates of the structure and on the k-point settings, so
+        repeated calls for an unchanged structure are fast.
+
         Args:
             structure (Structure/IStructure): structure to get Kpoints
         """
+        key = (self.mode, self.sym_prec, self.kpoints_line_density,
+               self.kpoints_settings["kpoints_density"],
+               structure.lattice.matrix.tostring(),
+               structure.frac_coords.tostring(),
+               tuple(site.species_string for site in structure))
+        kpoints = self._kpoints_cache.get(key)
+        if kpoints is None:
+            kpoints = self._get_kpoints(structure)
+            self._kpoints_cache[key] = kpoints
+            # Keep only the most recently generated KPOINTS.
+            if len(self._kpoints_cache) > 16:
+                self._kpoints_cache.popitem(last=False)
+        return copy.deepcopy(kpoints)
+
+    def _get_kpoints(self, structure):
         if self.mode == "Line":
             kpath = HighSymmKpath(structure)
             frac_k_points, k_points_labels = kpath.get_kpoints(line_density=self.kpoints_line_density,
@@ -1110,11 +1236,8 @@ class MPNonSCFVaspInputSet(MPStaticVaspInputSet):
             mesh = kpoints.kpts[0]
             ir_kpts = SpacegroupAnalyzer(structure, symprec=self.sym_prec) \
                 .get_ir_reciprocal_mesh(mesh)
-            kpts = []
-            weights = []
-            for k in ir_kpts:
-                kpts.append(k[0])
-                weights.append(int(k[1]))
+            kpts = [k[0] for k in ir_kpts]
+            weights = [int(k[1]) for k in ir_kpts]
             return Kpoints(comment="Non SCF run on uniform grid",
                            style="Reciprocal", num_kpts=len(ir_kpts),
                            kpts=kpts, kpts_weights=weights)
@@ -1139,8 +1262,7 @@ class MPNonSCFVaspInputSet(MPStaticVaspInputSet):
             ispin = 2
         else:
             ispin = 1
-        nbands = int(np.ceil(vasp_run.as_dict()["input"]["parameters"]["NBANDS"]
-                             * 1.2))
+        nbands = int(np.ceil(vasp_run.parameters["NBANDS"] * 1.2))
         incar_settings = {"ISPIN": ispin, "NBANDS": nbands}
         for grid in ["NGX", "NGY", "NGZ"]:
             if vasp_run.incar.get(grid):
@@ -1203,13 +1325,13 @@ class MPNonSCFVaspInputSet(MPStaticVaspInputSet):
 
         try:
             vasp_run = Vasprun(os.path.join(previous_vasp_dir, "vasprun.xml"),
-                               parse_dos=False, parse_eigen=None)
+                               parse_dos=False, parse_eigen=False,
+                               parse_potcar_file=False)
             outcar = Outcar(os.path.join(previous_vasp_dir, "OUTCAR"))
             previous_incar = vasp_run.incar
-        except:
-            traceback.print_exc()
+        except Exception as ex:
             raise RuntimeError("Can't get valid results from previous run: {}"
-                               .format(previous_vasp_dir))
+                               "\n{}".format(previous_vasp_dir, ex))
 
         #Get a Magmom-decorated structure
         structure = MPNonSCFVaspInputSet.get_structure(vasp_run, outcar,
@@ -1225,7 +1347,6 @@ class MPNonSCFVaspInputSet(MPStaticVaspInputSet):
                 shutil.copyfile(os.path.join(previous_vasp_dir, "CHGCAR"),
                                 os.path.join(output_dir, "CHGCAR"))
             except Exception as e:
-                traceback.print_exc()
                 raise RuntimeError("Can't copy CHGCAR from SC run" + '\n'
                                    + str(e))
 
@@ -1318,12 +1439,13 @@ class MPOpticsNonSCFVaspInputSet(MPNonSCFVaspInputSet):
 
         try:
             vasp_run = Vasprun(os.path.join(previous_vasp_dir, "vasprun.xml"),
-                               parse_dos=False, parse_eigen=False)
+                               parse_dos=False, parse_eigen=False,
+                               parse_potcar_file=False)
             outcar = Outcar(os.path.join(previous_vasp_dir, "OUTCAR"))
             previous_incar = vasp_run.incar
-        except:
-            traceback.print_exc()
-            raise RuntimeError("Can't get valid results from previous run. prev dir: {}".format(previous_vasp_dir))
+        except Exception as ex:
+            raise RuntimeError("Can't get valid results from previous run. "
+                               "prev dir: {}\n{}".format(previous_vasp_dir, ex))
 
         #Get a Magmom-decorated structure
         structure = MPNonSCFVaspInputSet.get_structure(vasp_run, outcar,
@@ -1340,7 +1462,6 @@ class MPOpticsNonSCFVaspInputSet(MPNonSCFVaspInputSet):
                 shutil.copyfile(os.path.join(previous_vasp_dir, "CHGCAR"),
                                 os.path.join(output_dir, "CHGCAR"))
             except Exception as e:
-                traceback.print_exc()
                 raise RuntimeError("Can't copy CHGCAR from SC run" + '\n'
                                    + str(e))
 
@@ -1383,8 +1504,7 @@ class MPOpticsNonSCFVaspInputSet(MPNonSCFVaspInputSet):
             ispin = 2
         else:
             ispin = 1
-        nbands = int(np.ceil(vasp_run.as_dict()["input"]["parameters"]["NBANDS"]
-                             * nbands_factor))
+        nbands = int(np.ceil(vasp_run.parameters["NBANDS"] * nbands_factor))
         incar_settings = {"ISPIN": ispin, "NBANDS": nbands}
         for grid in ["NGX", "NGY", "NGZ"]:
             if vasp_run.incar.get(grid):
@@ -1394,7 +1514,7 @@ class MPOpticsNonSCFVaspInputSet(MPNonSCFVaspInputSet):
 
 def batch_write_vasp_input(structures, vasp_input_set, output_dir,
                            make_dir_if_not_present=True, subfolder=None,
-                           sanitize=False, include_cif=False):
+                           sanitize=False, include_cif=False, ncores=None):
     """
     Batch write vasp input for a sequence of structures to
     output_dir, following the format output_dir/{group}/{formula}_{number}.
@@ -1414,17 +1534,46 @@ def batch_write_vasp_input(structures, vasp_input_set, output_dir,
             Defaults to False.
         include_cif (bool): Whether to output a CIF as well. CIF files are
             generally better supported in visualization programs.
+        ncores (int): Number of cores to use for writing the inputs. Uses
+            multiprocessing.Pool. Default is None, which implies serial.
     """
+    inputs = []
     for i, s in enumerate(structures):
-        formula = re.sub("\s+", "", s.formula)
         if subfolder is not None:
-            subdir = subfolder(s)
-            dirname = os.path.join(output_dir, subdir)
+            dirname = os.path.join(output_dir, subfolder(s))
         else:
-            dirname = os.path.join(output_dir, '{}_{}'.format(formula, i))
-        if sanitize:
-            s = s.copy(sanitize=True)
-        vasp_input_set.write_input(
-            s, dirname, make_dir_if_not_present=make_dir_if_not_present,
-            include_cif=include_cif
-        )
+            dirname = os.path.join(output_dir, '{}_{}'.format(
+                _WS_RE.sub("", s.formula), i))
+        inputs.append((s, vasp_input_set, dirname, make_dir_if_not_present,
+                       sanitize, include_cif))
+    if ncores:
+        p = Pool(ncores)
+        try:
+            p.map(_write_vasp_input, inputs, 1)
+        finally:
+            p.close()
+            p.join()
+    else:
+        for x in inputs:
+            _write_vasp_input(x)
+
+
+def _write_vasp_input(inputs):
+    """
+    Helper method for multiprocessing of batch_write_vasp_input. Must not be
+    nested in batch_write_vasp_input so that it can be pickled.
+
+    Args:
+        inputs: Tuple containing the structure, the vasp input set, the
+            output directory, and booleans indicating whether to make the
+            directory if not present, whether to sanitize the structure and
+            whether to include a CIF.
+    """
+    s, vasp_input_set, dirname, make_dir_if_not_present, sanitize, \
+        include_cif = inputs
+    if sanitize:
+        s = s.copy(sanitize=True)
+    vasp_input_set.write_input(
+        s, dirname, make_dir_if_not_present=make_dir_if_not_present,
+        include_cif=include_cif
+    )
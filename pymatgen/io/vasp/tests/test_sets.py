@@ -5,15 +5,18 @@ from __future__ import unicode_literals
 import unittest
 import os
 import shutil
+import tempfile
 
 import numpy as np
 from monty.json import MontyDecoder
+from monty.serialization import loadfn, dumpfn
 
-from pymatgen.io.vasp.sets import MITVaspInputSet, MITHSEVaspInputSet, \
+from pymatgen.io.vasp.sets import DictVaspInputSet, MITVaspInputSet, \
+    MITHSEVaspInputSet, \
     MPVaspInputSet, MITGGAVaspInputSet, MITNEBVaspInputSet,\
     MPStaticVaspInputSet, MPNonSCFVaspInputSet, MITMDVaspInputSet,\
     MPHSEVaspInputSet, MPBSHSEVaspInputSet, MPStaticDielectricDFPTVaspInputSet,\
-    MPOpticsNonSCFVaspInputSet
+    MPOpticsNonSCFVaspInputSet, batch_write_vasp_input
 from pymatgen.io.vasp.inputs import Poscar, Incar
 from pymatgen import Specie, Lattice, Structure
 
@@ -300,6 +303,61 @@ class MITMPVaspInputSetTest(unittest.TestCase):
         self.assertAlmostEqual(kpoints.kpts[-1][1], 0.5)
         self.assertAlmostEqual(kpoints.kpts[-1][2], 0.0)
 
+    def test_nonscf_kpoints_cache(self):
+        kpoints = self.mpnscfparamsetu.get_kpoints(self.struct)
+        kpoints.kpts = []
+        kpoints = self.mpnscfparamsetu.get_kpoints(self.struct)
+        self.assertEqual(kpoints.num_kpts, 168)
+        self.assertEqual(len(kpoints.kpts), 168)
+
+        struct = self.struct.copy()
+        struct.scale_lattice(struct.volume * 2)
+        kpoints = self.mpnscfparamsetu.get_kpoints(struct)
+        self.assertNotEqual(kpoints.num_kpts, 168)
+
+    def test_get_incar_nupdown(self):
+        paramset = MPVaspInputSet(constrain_total_magmom=True)
+        incar = paramset.get_incar(self.struct)
+        # Only the 4 Fe (5 each) exceed the 0.6 threshold.
+        self.assertEqual(incar['NUPDOWN'], 20)
+        # NUPDOWN is an integer INCAR tag, so integer magmoms must give an
+        # integer sum.
+        self.assertIsInstance(incar['NUPDOWN'], int)
+        self.assertEqual(Incar.from_string(incar.get_string())['NUPDOWN'], 20)
+
+        struct = self.struct.copy(site_properties={
+            "magmom": [5, -5, 5, -5] + [0.6] * 20})
+        incar = paramset.get_incar(struct)
+        self.assertAlmostEqual(incar['NUPDOWN'], 0)
+
+    def test_prepare_structure(self):
+        s = self.mitparamset._prepare_structure(self.struct)
+        self.assertEqual(s.composition, self.struct.composition)
+        # Already sorted structures are not rebuilt.
+        self.assertIs(self.mitparamset._prepare_structure(s), s)
+        unsorted = Structure.from_sites(list(reversed(s.sites)))
+        s2 = self.mitparamset._prepare_structure(unsorted)
+        self.assertIsNot(s2, unsorted)
+        self.assertEqual([site.specie for site in s2],
+                         [site.specie for site in s])
+        # The Poscar of a sorted structure does not share it.
+        poscar = self.mitparamset.get_poscar(s)
+        self.assertIsNot(poscar.structure, s)
+        self.assertEqual(poscar.structure, s)
+        d = self.mitparamset.get_all_vasp_input(s)
+        self.assertIsNot(d["POSCAR"].structure, s)
+
+    def test_static_primitive_cache(self):
+        p1 = self.mpstaticparamset._get_primitive_structure(self.struct)
+        p2 = self.mpstaticparamset._get_primitive_structure(self.struct)
+        self.assertEqual(p1, p2)
+        self.assertIsNot(p1, p2)
+        # A modified structure must not get the cached primitive cell.
+        struct = self.struct.copy()
+        struct.scale_lattice(struct.volume * 2)
+        p3 = self.mpstaticparamset._get_primitive_structure(struct)
+        self.assertAlmostEqual(p3.volume, p1.volume * 2)
+
     def test_get_all_vasp_input(self):
         d = self.mitparamset.get_all_vasp_input(self.struct)
         self.assertEqual(d["INCAR"]["ISMEAR"], -5)
@@ -307,6 +365,82 @@ class MITMPVaspInputSetTest(unittest.TestCase):
         d = self.mitparamset.get_all_vasp_input(self.struct)
         self.assertEqual(d["INCAR"]["ISMEAR"], 0)
 
+    def test_config_not_shared(self):
+        # The parsed config files are cached, but each input set must still
+        # get its own copy of the settings.
+        paramset = MPVaspInputSet()
+        self.assertEqual(paramset.incar_settings,
+                         self.paramset.incar_settings)
+        self.assertNotEqual(paramset.incar_settings["MAGMOM"],
+                            self.userparamset.incar_settings["MAGMOM"])
+        self.assertNotEqual(paramset.incar_settings["NSW"],
+                            self.mpstaticparamset.incar_settings["NSW"])
+        paramset.incar_settings["ENCUT"] = 1000
+        self.assertNotEqual(MPVaspInputSet().incar_settings["ENCUT"], 1000)
+        # The kpoints settings are shared with the config and modified in
+        # place by MPStaticVaspInputSet.
+        self.mpstaticparamset.get_kpoints(self.struct)
+        self.assertNotIn("grid_density", MPVaspInputSet().kpoints_settings)
+        kpoints = MPVaspInputSet().get_kpoints(self.struct)
+        self.assertEqual(kpoints.kpts, [[2, 4, 6]])
+        self.assertEqual(kpoints.style, 'Monkhorst')
+
+    def test_batch_write_vasp_input(self):
+        struct = self.struct.copy()
+        struct.scale_lattice(struct.volume * 1.1)
+        structs = [self.struct, struct]
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            serial_dir = os.path.join(tmp_dir, "serial")
+            pool_dir = os.path.join(tmp_dir, "pool")
+            batch_write_vasp_input(structs, self.mitparamset, serial_dir,
+                                   sanitize=True, include_cif=True)
+            batch_write_vasp_input(structs, self.mitparamset, pool_dir,
+                                   sanitize=True, include_cif=True, ncores=2)
+            for i in range(2):
+                d = "Fe4P4O16_{}".format(i)
+                self.assertIn("Fe4 P4 O16.cif",
+                              os.listdir(os.path.join(pool_dir, d)))
+                for f in ["INCAR", "KPOINTS", "POSCAR", "POTCAR"]:
+                    with open(os.path.join(serial_dir, d, f)) as f1, \
+                            open(os.path.join(pool_dir, d, f)) as f2:
+                        self.assertEqual(f1.read(), f2.read())
+
+            # Directory names from a subfolder callable are resolved before
+            # the structures are handed to the pool.
+            sub_dir = os.path.join(tmp_dir, "sub")
+            batch_write_vasp_input(
+                structs, self.mitparamset, sub_dir, ncores=2,
+                subfolder=lambda s: "vol_{}".format(int(round(s.volume))))
+            self.assertEqual(
+                sorted(os.listdir(sub_dir)),
+                sorted("vol_{}".format(int(round(s.volume)))
+                       for s in structs))
+            poscar = Poscar.from_file(os.path.join(
+                sub_dir, "vol_{}".format(int(round(struct.volume))),
+                "POSCAR"))
+            self.assertAlmostEqual(poscar.structure.volume, struct.volume)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_from_file_reloads(self):
+        config = loadfn(os.path.join(os.path.dirname(__file__), "..",
+                                     "MITVaspInputSet.yaml"))
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(tmp_dir, "my_set.yaml")
+            dumpfn(config, filename)
+            vis = DictVaspInputSet.from_file("mine", filename)
+            self.assertEqual(vis.incar_settings["ENCUT"],
+                             config["INCAR"]["ENCUT"])
+            # User config files are re-read, so that edits are picked up.
+            config["INCAR"]["ENCUT"] = 1234
+            dumpfn(config, filename)
+            vis = DictVaspInputSet.from_file("mine", filename)
+            self.assertEqual(vis.incar_settings["ENCUT"], 1234)
+        finally:
+            shutil.rmtree(tmp_dir)
+
     def test_to_from_dict(self):
         self.mitparamset = MITVaspInputSet()
         self.mithseparamset = MITHSEVaspInputSet()
@@ -411,6 +545,32 @@ class MITNEBVaspInputSetTest(unittest.TestCase):
         fc = self.vis._process_structures(structs)[2].frac_coords
         self.assertTrue(np.allclose(fc, [[0.5]*3,[0.9, 1.033333, 1.0333333]]))
 
+    def test_write_input_threads(self):
+        if "VASP_PSP_DIR" not in os.environ:
+            os.environ["VASP_PSP_DIR"] = test_dir
+        c1 = [[0.5] * 3, [0.9] * 3]
+        c2 = [[0.5] * 3, [0.9, 0.1, 0.1]]
+        s1 = Structure(Lattice.cubic(5), ['Si', 'Si'], c1)
+        s2 = Structure(Lattice.cubic(5), ['Si', 'Si'], c2)
+        structs = [Structure.from_sites(s.sites, to_unit_cell=True)
+                   for s in s1.interpolate(s2, 11, pbc=True)]
+        images = self.vis._process_structures([s.copy() for s in structs])
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            self.vis.write_input(structs, tmp_dir, write_cif=True,
+                                 nthreads=2)
+            for f in ["INCAR", "KPOINTS", "POTCAR"]:
+                self.assertTrue(os.path.exists(os.path.join(tmp_dir, f)))
+            for i, image in enumerate(images):
+                d = os.path.join(tmp_dir, str(i).zfill(2))
+                poscar = Poscar.from_file(os.path.join(d, "POSCAR"))
+                self.assertTrue(np.allclose(poscar.structure.frac_coords,
+                                            image.frac_coords, atol=1e-5))
+                self.assertTrue(os.path.exists(
+                    os.path.join(d, "{}.cif".format(i))))
+        finally:
+            shutil.rmtree(tmp_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
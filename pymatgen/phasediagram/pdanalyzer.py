@@ -56,14 +56,69 @@ class PDAnalyzer(object):
             pd: Phase Diagram to analyze.
         """
         self._pd = pd
+        self._el_index = {el: i for i, el in enumerate(pd.elements)}
+        # Normalized compositions and energies per atom of the qhull entries
+        # as arrays, so that the matrices for a facet are simple gathers.
+        self._qhull_comp = self._make_comp_matrix(
+            [e.composition for e in pd.qhull_entries])
+        self._qhull_epa = np.array([e.energy_per_atom
+                                    for e in pd.qhull_entries])
+        # Vertex indices of all facets as a 2-D array, for gathers.
+        self._facets_arr = np.asarray(pd.facets, dtype=np.intp)
+        # Inverses of the augmented vertex matrices of all facets. The
+        # barycentric coordinates of a composition in every facet are then
+        # obtained with a single product, as in pyhull's Simplex.
+        coords = pd.qhull_data[self._facets_arr, :-1]
+        aug = np.concatenate([coords, np.ones(coords.shape[:2] + (1,))],
+                             axis=-1)
+        self._facet_aug_inv = np.linalg.inv(aug)
+        # Chemical potentials of all facets, one row per facet in the order
+        # of pd.facets, solved as a single stack of linear systems.
+        self._facet_chempots = np.linalg.solve(
+            self._qhull_comp[self._facets_arr],
+            self._qhull_epa[self._facets_arr][..., np.newaxis])[..., 0]
+        # Grand potential analyzers built by get_element_profile for the last
+        # element queried, as (element, {chempot: analyzer}). They only
+        # depend on the stable entries, so profiles of several compositions
+        # against the same element can share them.
+        self._gc_analyzers = (None, {})
 
     def _make_comp_matrix(self, complist):
         """
         Helper function to generates a normalized composition matrix from a
         list of compositions.
         """
-        return np.array([[comp.get_atomic_fraction(el)
-                          for el in self._pd.elements] for comp in complist])
+        m = np.zeros((len(complist), len(self._pd.elements)))
+        # Only the elements actually present in each composition are visited.
+        for i, comp in enumerate(complist):
+            for el, amt in comp.items():
+                j = self._el_index.get(el)
+                if j is not None:
+                    m[i, j] = abs(amt) / comp.num_atoms
+        return m
+
+    def _get_facet_indices(self, comps):
+        """
+        Get the index in pd.facets of any facet that each of a sequence of
+        compositions falls into. All compositions are tested against all
+        facets at once.
+        """
+        for comp in comps:
+            if set(comp.elements).difference(self._pd.elements):
+                raise ValueError('{} has elements not in the phase diagram {}'
+                                 ''.format(comp, self._pd.elements))
+        c = np.array([[comp.get_atomic_fraction(e)
+                       for e in self._pd.elements[1:]] + [1]
+                      for comp in comps])
+        # bary_coords[i, j] are the barycentric coords of comps[i] in facet j.
+        bary_coords = np.dot(c, self._facet_aug_inv)
+        in_facet = np.all(bary_coords >= -PDAnalyzer.numerical_tol / 10,
+                          axis=2)
+        found = in_facet.any(axis=1)
+        if not found.all():
+            raise RuntimeError("No facet found for comp = {}".format(
+                comps[int(np.argmin(found))]))
+        return np.argmax(in_facet, axis=1)
 
     @lru_cache(1)
     def _get_facet(self, comp):
@@ -71,14 +126,7 @@ class PDAnalyzer(object):
         Get any facet that a composition falls into. Cached so successive
         calls at same composition are fast.
         """
-        if set(comp.elements).difference(self._pd.elements):
-            raise ValueError('{} has elements not in the phase diagram {}'
-                             ''.format(comp, self._pd.elements))
-        c = [comp.get_atomic_fraction(e) for e in self._pd.elements[1:]]
-        for f, s in zip(self._pd.facets, self._pd.simplices):
-            if s.in_simplex(c, PDAnalyzer.numerical_tol / 10):
-                return f
-        raise RuntimeError("No facet found for comp = {}".format(comp))
+        return self._pd.facets[self._get_facet_indices([comp])[0]]
 
     def get_decomposition(self, comp):
         """
@@ -91,13 +139,12 @@ class PDAnalyzer(object):
             Decomposition as a dict of {Entry: amount}
         """
         facet = self._get_facet(comp)
-        comp_list = [self._pd.qhull_entries[i].composition for i in facet]
-        m = self._make_comp_matrix(comp_list)
-        compm = self._make_comp_matrix([comp])
-        decomp_amts = np.linalg.solve(m.T, compm.T)
-        return {self._pd.qhull_entries[f]: amt[0]
+        m = self._qhull_comp[facet]
+        compm = self._make_comp_matrix([comp])[0]
+        decomp_amts = np.linalg.solve(m.T, compm)
+        return {self._pd.qhull_entries[f]: amt
                 for f, amt in zip(facet, decomp_amts)
-                if abs(amt[0]) > PDAnalyzer.numerical_tol}
+                if abs(amt) > PDAnalyzer.numerical_tol}
 
     def get_hull_energy(self, comp):
         """
@@ -133,15 +180,14 @@ class PDAnalyzer(object):
             return {entry: 1}, 0
 
         facet = self._get_facet(entry.composition)
-        comp_list = [self._pd.qhull_entries[i].composition for i in facet]
-        m = self._make_comp_matrix(comp_list)
-        compm = self._make_comp_matrix([entry.composition])
-        decomp_amts = np.linalg.solve(m.T, compm.T)[:,0]
+        m = self._qhull_comp[facet]
+        compm = self._make_comp_matrix([entry.composition])[0]
+        decomp_amts = np.linalg.solve(m.T, compm)
         decomp = {self._pd.qhull_entries[facet[i]]: decomp_amts[i]
                   for i in range(len(decomp_amts))
                   if abs(decomp_amts[i]) > PDAnalyzer.numerical_tol}
-        energies = [self._pd.qhull_entries[i].energy_per_atom for i in facet]
-        ehull = entry.energy_per_atom - np.dot(decomp_amts, energies)
+        ehull = entry.energy_per_atom - np.dot(decomp_amts,
+                                               self._qhull_epa[facet])
         if allow_negative or ehull >= -PDAnalyzer.numerical_tol:
             return decomp, ehull
         raise ValueError("No valid decomp found!")
@@ -177,8 +223,13 @@ class PDAnalyzer(object):
                              "for stable entries.")
         if entry.is_element:
             return 0
-        entries = [e for e in self._pd.stable_entries if e != entry]
-        modpd = PhaseDiagram(entries, self._pd.elements)
+        # The decomposition of entry only involves phases within its own
+        # chemical system, so the hull is rebuilt for that subsystem only.
+        els = set(entry.composition.elements)
+        entries = [e for e in self._pd.stable_entries
+                   if e != entry and els.issuperset(e.composition.elements)]
+        modpd = PhaseDiagram(entries, [el for el in self._pd.elements
+                                       if el in els])
         analyzer = PDAnalyzer(modpd)
         return analyzer.get_decomp_and_e_above_hull(entry,
                                                     allow_negative=True)[1]
@@ -193,15 +244,13 @@ class PDAnalyzer(object):
         Returns:
             { element: chempot } for all elements in the phase diagram.
         """
-        complist = [self._pd.qhull_entries[i].composition for i in facet]
-        energylist = [self._pd.qhull_entries[i].energy_per_atom for i in facet]
-        m = self._make_comp_matrix(complist)
-        chempots = np.linalg.solve(m, energylist)
+        chempots = np.linalg.solve(self._qhull_comp[facet],
+                                   self._qhull_epa[facet])
         return dict(zip(self._pd.elements, chempots))
 
     def get_composition_chempots(self, comp):
-        facet = self._get_facet(comp)
-        return self.get_facet_chempots(facet)
+        i = self._get_facet_indices([comp])[0]
+        return dict(zip(self._pd.elements, self._facet_chempots[i]))
 
     def get_transition_chempots(self, element):
         """
@@ -219,20 +268,11 @@ class PDAnalyzer(object):
             raise ValueError("get_transition_chempots can only be called with "
                              "elements in the phase diagram.")
 
-        critical_chempots = []
-        for facet in self._pd.facets:
-            chempots = self.get_facet_chempots(facet)
-            critical_chempots.append(chempots[element])
-
-        clean_pots = []
-        for c in sorted(critical_chempots):
-            if len(clean_pots) == 0:
-                clean_pots.append(c)
-            else:
-                if abs(c - clean_pots[-1]) > PDAnalyzer.numerical_tol:
-                    clean_pots.append(c)
-        clean_pots.reverse()
-        return tuple(clean_pots)
+        critical_chempots = np.sort(
+            self._facet_chempots[:, self._el_index[element]])
+        keep = np.concatenate(
+            ([True], np.diff(critical_chempots) > PDAnalyzer.numerical_tol))
+        return tuple(critical_chempots[keep][::-1].tolist())
 
     def get_element_profile(self, element, comp, comp_tol=1e-5):
         """
@@ -262,34 +302,36 @@ class PDAnalyzer(object):
                               if el != element})
         elref = self._pd.el_refs[element]
         elcomp = Composition(element.symbol)
-        prev_decomp = []
+        prev_decomp = frozenset()
         evolution = []
 
-        def are_same_decomp(decomp1, decomp2):
-            for comp in decomp2:
-                if comp not in decomp1:
-                    return False
-            return True
+        cached_el, analyzers = self._gc_analyzers
+        if cached_el != element:
+            analyzers = {}
+            self._gc_analyzers = (element, analyzers)
 
         for c in chempots:
-            gcpd = GrandPotentialPhaseDiagram(
-                stable_entries, {element: c - 1e-5}, self._pd.elements
-            )
-            analyzer = PDAnalyzer(gcpd)
-            gcdecomp = analyzer.get_decomposition(gccomp)
-            decomp = [gcentry.original_entry.composition
-                      for gcentry, amt in gcdecomp.items()
-                      if amt > comp_tol]
+            analyzer = analyzers.get(c)
+            if analyzer is None:
+                gcpd = GrandPotentialPhaseDiagram(
+                    stable_entries, {element: c - 1e-5}, self._pd.elements
+                )
+                analyzer = PDAnalyzer(gcpd)
+                analyzers[c] = analyzer
             decomp_entries = [gcentry.original_entry
-                              for gcentry, amt in gcdecomp.items()
+                              for gcentry, amt in
+                              analyzer.get_decomposition(gccomp).items()
                               if amt > comp_tol]
+            decomp = [entry.composition for entry in decomp_entries]
 
-            if not are_same_decomp(prev_decomp, decomp):
+            # A new step only starts when a phase appears that was not in the
+            # previous decomposition.
+            if not prev_decomp.issuperset(decomp):
                 if elcomp not in decomp:
                     decomp.insert(0, elcomp)
                 rxn = Reaction([comp], decomp)
                 rxn.normalize_to(comp)
-                prev_decomp = decomp
+                prev_decomp = frozenset(decomp)
                 amt = -rxn.coeffs[rxn.all_comp.index(elcomp)]
                 evolution.append({'chempot': c,
                                   'evolution': amt,
@@ -319,34 +361,29 @@ class PDAnalyzer(object):
             simplices are the sides of the N-1 dim polytope bounding the
             allowable chemical potential range of each entry.
         """
-        all_chempots = []
         pd = self._pd
-        facets = pd.facets
-        for facet in facets:
-            chempots = self.get_facet_chempots(facet)
-            all_chempots.append([chempots[el] for el in pd.elements])
+        all_chempots = self._facet_chempots
         inds = [pd.elements.index(el) for el in elements]
-        el_energies = {el: 0.0 for el in elements}
+        # Chemical potentials of the requested elements in every facet,
+        # relative to the elemental references if needed.
+        mu = all_chempots[:, inds]
         if referenced:
-            el_energies = {el: pd.el_refs[el].energy_per_atom
-                           for el in elements}
+            mu = mu - np.array([pd.el_refs[el].energy_per_atom
+                                for el in elements])
         chempot_ranges = collections.defaultdict(list)
         vertices = [list(range(len(self._pd.elements)))]
         if len(all_chempots) > len(self._pd.elements):
             vertices = get_facets(all_chempots, joggle=joggle,
                                   force_use_pyhull=force_use_pyhull)
+        facet_sets = [set(facet) for facet in self._facets_arr.tolist()]
         for ufacet in vertices:
             for combi in itertools.combinations(ufacet, 2):
-                data1 = facets[combi[0]]
-                data2 = facets[combi[1]]
-                common_ent_ind = set(data1).intersection(set(data2))
+                common_ent_ind = facet_sets[combi[0]].intersection(
+                    facet_sets[combi[1]])
                 if len(common_ent_ind) == len(elements):
                     common_entries = [pd.qhull_entries[i]
                                       for i in common_ent_ind]
-                    data = np.array([[all_chempots[i][j]
-                                      - el_energies[pd.elements[j]]
-                                      for j in inds] for i in combi])
-                    sim = Simplex(data)
+                    sim = Simplex(mu[list(combi)])
                     for entry in common_entries:
                         chempot_ranges[entry].append(sim)
 
@@ -23,7 +23,6 @@ import itertools
 from pymatgen.phasediagram.pdanalyzer import PDAnalyzer
 from pymatgen.util.string_utils import latexify
 from pymatgen.util.plotting_utils import get_publication_quality_plot
-from pymatgen.util.coord_utils import in_coord_list
 
 
 class PDPlotter(object):
@@ -405,6 +404,8 @@ class PDPlotter(object):
             center_x = 0
             center_y = 0
             coords = []
+            # Rounded coords already in coords, for constant time lookups.
+            seen = set()
             contain_zero = any([comp.get_atomic_fraction(el) == 0
                                 for el in elements])
             is_boundary = (not contain_zero) and \
@@ -414,7 +415,9 @@ class PDPlotter(object):
                 plt.plot(x, y, "k-")
 
                 for coord in line.coords:
-                    if not in_coord_list(coords, coord):
+                    key = tuple(np.round(coord, 8))
+                    if key not in seen:
+                        seen.add(key)
                         coords.append(coord.tolist())
                         center_x += coord[0]
                         center_y += coord[1]
@@ -38,6 +38,15 @@ class PDAnalyzerTest(unittest.TestCase):
             self.assertLessEqual(
                 self.analyzer.get_equilibrium_reaction_energy(entry), 0,
                 "Stable entries should have negative equilibrium reaction energy!")
+        for entry in self.pd.stable_entries:
+            if entry.is_element:
+                continue
+            entries = [e for e in self.pd.stable_entries if e != entry]
+            analyzer = PDAnalyzer(PhaseDiagram(entries, self.pd.elements))
+            self.assertAlmostEqual(
+                self.analyzer.get_equilibrium_reaction_energy(entry),
+                analyzer.get_decomp_and_e_above_hull(
+                    entry, allow_negative=True)[1])
 
     def test_get_decomposition(self):
         for entry in self.pd.stable_entries:
@@ -59,6 +68,17 @@ class PDAnalyzerTest(unittest.TestCase):
         for k, v in expected_ans.items():
             self.assertAlmostEqual(ansdict[k], v)
 
+    def test_get_facet_indices(self):
+        entries = list(self.pd.stable_entries)
+        inds = self.analyzer._get_facet_indices(
+            [entry.composition for entry in entries])
+        self.assertEqual(len(inds), len(entries))
+        for entry, i in zip(entries, inds):
+            self.assertIn(self.pd.qhull_entries.index(entry),
+                          list(self.pd.facets[i]))
+        self.assertRaises(ValueError, self.analyzer._get_facet_indices,
+                          [Composition("Li2Mn")])
+
     def test_get_transition_chempots(self):
         for el in self.pd.elements:
             self.assertLessEqual(len(self.analyzer.get_transition_chempots(el)),
@@ -71,6 +91,27 @@ class PDAnalyzerTest(unittest.TestCase):
                     self.assertLessEqual(len(self.analyzer.get_element_profile(el, entry.composition)),
                                          len(self.pd.facets))
 
+    def test_get_element_profile_reuses_analyzers(self):
+        comp = Composition("Li3Fe7O11")
+        el = Element("O")
+        profile = self.analyzer.get_element_profile(el, comp)
+        cached_el, analyzers = self.analyzer._gc_analyzers
+        self.assertEqual(cached_el, el)
+        self.assertEqual(len(analyzers),
+                         len(self.analyzer.get_transition_chempots(el)))
+        cached = dict(analyzers)
+        profile2 = self.analyzer.get_element_profile(el, comp)
+        for c, analyzer in self.analyzer._gc_analyzers[1].items():
+            self.assertIs(analyzer, cached[c])
+        self.assertEqual(len(profile), len(profile2))
+        for d1, d2 in zip(profile, profile2):
+            self.assertAlmostEqual(d1['chempot'], d2['chempot'])
+            self.assertAlmostEqual(d1['evolution'], d2['evolution'])
+            self.assertEqual(d1['entries'], d2['entries'])
+        # Only the analyzers of the last element queried are kept.
+        self.analyzer.get_element_profile(Element("Li"), comp)
+        self.assertEqual(self.analyzer._gc_analyzers[0], Element("Li"))
+
     def test_get_get_chempot_range_map(self):
         elements = [el for el in self.pd.elements if el.symbol != "Fe"]
         self.assertEqual(len(self.analyzer.get_chempot_range_map(elements)), 10)